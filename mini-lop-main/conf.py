@@ -51,6 +51,9 @@ def parse_config(config_file, overwrite_output=True):
         else:
             conf_dict['dictionary_file'] = None
 
+        # Shared memory fuzzing (the target must read test cases from __AFL_SHM_FUZZ_ID)
+        conf_dict['shm_fuzz'] = bool(conf_dict.get('shm_fuzz', False))
+
         # Create crashes folder
         crashes_folder = os.path.join(conf_dict['output_folder'], 'crashes')
         if not os.path.exists(crashes_folder):
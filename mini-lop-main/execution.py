@@ -1,8 +1,9 @@
 import os
+import select
 import signal
-import threading
+import sys
 import time
-from feedback import clear_shm
+from feedback import MAP_SIZE, clear_shm
 
 # this is the timeout per execution in milliseconds
 # in practice, this is better to be implemented as a configurable option in the config file
@@ -10,12 +11,103 @@ from feedback import clear_shm
 TIMEOUT = 10000
 TIMEOUT_SEC = float(TIMEOUT/10000)
 
+# fork server control words (lscpu | grep "Byte Order"), built once instead of per run
+CTL_RUN = (0).to_bytes(4, byteorder='little')
+CTL_RUN_AFTER_KILL = (1).to_bytes(4, byteorder='little')
 
-def monitor_timeout(grandchild_pid):
-    """Thread function to monitor if the status byte is read within the timeout period."""
-    time.sleep(TIMEOUT_SEC)
+# AFL++ fork server options, advertised in the hello word (AFL++ include/types.h)
+FS_OPT_ENABLED = 0x80000001
+FS_OPT_MAPSIZE = 0x40000000
+FS_OPT_AUTODICT = 0x10000000
+FS_OPT_SHDMEM_FUZZ = 0x01000000
+# newer AFL++ targets send "AFL" plus a protocol version and negotiate afterwards
+FS_NEW_HELLO = 0x41464c00
+FS_NEW_VERSION_MIN = 1
+FS_NEW_VERSION_MAX = 1
+FS_NEW_OPT_MAPSIZE = 0x00000001
+FS_NEW_OPT_SHDMEM_FUZZ = 0x00000002
+FS_NEW_OPT_AUTODICT = 0x00000800
+
+
+def read_status_word(st_read_fd):
+    """Read one 4-byte word from the fork server, exiting if the pipe was closed."""
+    word = os.read(st_read_fd, 4)
+    if len(word) != 4:
+        sys.exit("fork server handshake failed, is the target instrumented?")
+    return int.from_bytes(word, byteorder='little', signed=False)
+
+
+def get_legacy_map_size(status):
+    """Decode the map size of a legacy hello with FS_OPT_MAPSIZE (AFL++ FS_OPT_GET_MAPSIZE)."""
+    return ((status & 0x00fffffe) >> 1) + 1
+
+
+def check_map_size(map_size):
+    """Exit if the target's coverage map does not fit in the MAP_SIZE segment."""
+    if map_size > MAP_SIZE:
+        sys.exit(f"target coverage map is {map_size} bytes, larger than MAP_SIZE ({MAP_SIZE})")
+
+
+def init_forkserver(ctl_write_fd, st_read_fd, shm_fuzz=False):
+    """
+    Reads the fork server hello and answers the AFL++ option negotiation.
+
+    Plain AFL targets only send the hello. AFL++ targets that advertise
+    shared memory test cases or an auto dictionary block on a reply word
+    before their first run, and versioned AFL++ targets need the full
+    handshake. The auto dictionary is declined (or read and dropped).
+
+    Args:
+        ctl_write_fd: Control write file descriptor
+        st_read_fd: Status read file descriptor
+        shm_fuzz (bool): Whether test cases are passed via shared memory
+
+    Exits if shm_fuzz does not match whether the target reads shared memory
+    test cases, or if the target reports a map larger than MAP_SIZE (it
+    would write past the coverage segment).
+    """
+    status = read_status_word(st_read_fd)
+    target_shm_fuzz = False
+
+    if FS_NEW_HELLO <= status <= FS_NEW_HELLO + 0xff:
+        version = status - FS_NEW_HELLO
+        if not FS_NEW_VERSION_MIN <= version <= FS_NEW_VERSION_MAX:
+            sys.exit(f"unsupported fork server protocol version {version}")
+        os.write(ctl_write_fd, (status ^ 0xffffffff).to_bytes(4, byteorder='little'))
+        options = read_status_word(st_read_fd)
+        if options & FS_NEW_OPT_MAPSIZE:
+            check_map_size(read_status_word(st_read_fd))
+        target_shm_fuzz = bool(options & FS_NEW_OPT_SHDMEM_FUZZ)
+        if options & FS_NEW_OPT_AUTODICT:
+            dict_len = read_status_word(st_read_fd)
+            while dict_len > 0:
+                chunk = os.read(st_read_fd, dict_len)
+                if not chunk:
+                    sys.exit("fork server closed the pipe while sending its dictionary")
+                dict_len -= len(chunk)
+        if read_status_word(st_read_fd) != status:
+            sys.exit("unexpected response from the fork server during the handshake")
+    elif (status & FS_OPT_ENABLED) == FS_OPT_ENABLED:
+        if status & FS_OPT_MAPSIZE:
+            check_map_size(get_legacy_map_size(status))
+        target_shm_fuzz = bool(status & FS_OPT_SHDMEM_FUZZ)
+        if status & (FS_OPT_SHDMEM_FUZZ | FS_OPT_AUTODICT):
+            # without this reply the target never maps the test case segment and
+            # takes the first control word as the answer
+            reply = FS_OPT_ENABLED | FS_OPT_SHDMEM_FUZZ if shm_fuzz and target_shm_fuzz else FS_OPT_ENABLED
+            os.write(ctl_write_fd, reply.to_bytes(4, byteorder='little'))
+
+    if target_shm_fuzz and not shm_fuzz:
+        # without the segment an __AFL_FUZZ_TESTCASE_BUF target reads stdin
+        # instead, and every run would hang until the timeout
+        sys.exit("target requires shared memory test cases, set shm_fuzz = true")
+    if shm_fuzz and not target_shm_fuzz:
+        sys.exit("shm_fuzz is set but the target does not read test cases from shared memory")
+
+
+def kill_on_timeout(grandchild_pid):
+    """Kill the grandchild process when its status was not reported within the timeout period."""
     try:
-        # Kill the grandchild process if the main thread hasn't read the status byte
         os.kill(grandchild_pid, signal.SIGKILL)
         print(f"Timeout of {TIMEOUT} ms reached. Killed grandchild process {grandchild_pid}.")
     except OSError:
@@ -24,12 +116,14 @@ def monitor_timeout(grandchild_pid):
         pass
 
 
-def run_target(ctl_write_fd, st_read_fd, trace_bits):
+def run_target(ctl_write_fd, st_read_fd, trace_bits, dirty_idx=None, was_killed=False):
     # need to clear the shared memory before running the target
-    clear_shm(trace_bits)
+    # (only the bytes in dirty_idx if the caller knows what the last run hit)
+    clear_shm(trace_bits, dirty_idx)
 
-    # lscpu | grep "Byte Order"
-    os.write(ctl_write_fd, (0).to_bytes(4, byteorder='little'))
+    # the control word tells a persistent mode (__AFL_LOOP) fork server whether
+    # the previous child was killed, so it forks a new one instead of resuming it
+    os.write(ctl_write_fd, CTL_RUN_AFTER_KILL if was_killed else CTL_RUN)
     start_time = time.time()
 
     # print only for debugging purpose
@@ -38,12 +132,13 @@ def run_target(ctl_write_fd, st_read_fd, trace_bits):
     # print("grandchild pid is {}".format(int.from_bytes(grandchild_pid_bytes, byteorder='little', signed=False)))
     status_bytes = None
 
-    timeout_thread = threading.Thread(target=monitor_timeout, args=(grandchild_pid,))
-    timeout_thread.start()
-
-    if timeout_thread.is_alive():
-        # don't poll too frequently, sleep for 1ms
-        timeout_thread.join(0.0001)
+    # wait for the status with a timeout instead of a watchdog thread: in
+    # persistent mode the child stays alive (stopped) between runs, so it
+    # must only be killed while a run is actually in progress
+    ready, _, _ = select.select([st_read_fd], [], [], TIMEOUT_SEC)
+    timed_out = not ready
+    if timed_out:
+        kill_on_timeout(grandchild_pid)
 
     status_bytes = os.read(st_read_fd, 4)
     status_code = int.from_bytes(status_bytes, byteorder='little', signed=False)
@@ -54,4 +149,8 @@ def run_target(ctl_write_fd, st_read_fd, trace_bits):
     # print(f"Execution time: {float(exec_time*1000)} ms")
     # time.sleep(1)
 
-    return status_code, exec_time
\ No newline at end of file
+    # timed_out reports whether the kill was sent, not the status: a persistent
+    # child may report itself stopped just as the timeout fires, and the next
+    # control word must still tell the fork server it is gone (like AFL's
+    # last_run_timed_out)
+    return status_code, exec_time, timed_out
\ No newline at end of file
@@ -8,36 +8,77 @@ This module handles three core functionalities:
 
 The shared memory is used to track edge coverage during program execution,
 following AFL's design where the target program writes to a shared memory region
-to indicate which edges were executed.
+to indicate which edges were executed. Optionally, a second segment is used to
+pass test cases to the target (AFL++ shared memory fuzzing) instead of a file.
 """
 
 import ctypes
+import struct
 import sys
+import numpy as np
 import sysv_ipc
 
 # Environment variable used by instrumented binaries to locate shared memory
 SHM_ENV_VAR = "__AFL_SHM_ID"
+# Environment variable used by AFL++ targets to locate the test case shared memory
+SHM_FUZZ_ENV_VAR = "__AFL_SHM_FUZZ_ID"
 
 # Coverage map size (2^16 = 65536 edges)
 MAP_SIZE_POW2 = 16
 MAP_SIZE = (1 << MAP_SIZE_POW2)
 
-def setup_shm(libc):
+# Hit count buckets, same as AFL's classify_counts:
+# 0 -> 0, 1 -> 1, 2 -> 2, 3 -> 4, 4-7 -> 8, 8-15 -> 16, 16-31 -> 32, 32-127 -> 64, 128-255 -> 128
+COUNT_CLASS_LOOKUP = np.array([0, 1, 2, 4] + [8] * 4 + [16] * 8 + [32] * 16 + [64] * 96 + [128] * 128,
+                              dtype=np.uint8)
+
+# Recognized crash signals, names are only needed when reporting a crash
+CRASH_SIGNALS = {
+    1: "SIGHUP",    # Hangup (terminal disconnected)
+    2: "SIGINT",    # Interrupt (Ctrl+C)
+    3: "SIGQUIT",   # Quit (Ctrl+\)
+    4: "SIGILL",    # Illegal instruction
+    6: "SIGABRT",   # Abort (assert failure)
+    7: "SIGBUS",    # Bus error (bad memory access)
+    8: "SIGFPE",    # Floating point exception
+    9: "SIGKILL",   # Kill (immediate termination)
+    11: "SIGSEGV",  # Segmentation fault
+    13: "SIGPIPE",  # Broken pipe
+    14: "SIGALRM",  # Alarm clock
+    15: "SIGTERM",  # Termination request
+    24: "SIGXCPU",  # CPU time limit exceeded
+    25: "SIGXFSZ",  # File size limit exceeded
+    31: "SIGSYS"    # Bad system call
+}
+# One bit per crash signal number, tested with (_CRASH_MASK >> signal) & 1
+_CRASH_SIGS = frozenset(CRASH_SIGNALS)
+_CRASH_MASK = sum(1 << sig for sig in _CRASH_SIGS)
+
+# Maximum test case size for shared memory fuzzing (1 MiB); the segment holds
+# a 4-byte little-endian length followed by the test case bytes
+MAX_FILE = (1 << 20)
+SHM_FUZZ_MAP_SIZE = MAX_FILE + 4
+
+def setup_shm(libc, size=MAP_SIZE):
     """
     Sets up shared memory for coverage feedback collection.
     
     This function:
     1. Creates a shared memory segment
     2. Maps it into the current process's address space
-    3. Returns identifiers needed for target program communication
+    3. Wraps the mapping in a zero-copy NumPy view
+    4. Returns identifiers needed for target program communication
     
     Args:
         libc: C library instance for system calls
+        size (int): Segment size in bytes, SHM_FUZZ_MAP_SIZE for the test case segment
         
     Returns:
-        tuple: (shmid, shmptr)
+        tuple: (shmid, shmptr, shm_view)
             shmid (int): Shared memory segment identifier
             shmptr (int): Pointer to mapped shared memory
+            shm_view (np.ndarray): uint8 view of the mapping, shape (size,);
+                reads and writes go straight to the shared memory
             
     Raises:
         SystemExit: If shared memory creation or attachment fails
@@ -54,7 +95,7 @@ def setup_shm(libc):
     shmat.argtypes = (ctypes.c_int, ctypes.c_void_p, ctypes.c_int)
 
     # Create shared memory segment
-    shmid = shmget(sysv_ipc.IPC_PRIVATE, MAP_SIZE, 
+    shmid = shmget(sysv_ipc.IPC_PRIVATE, size, 
                    sysv_ipc.IPC_CREAT | sysv_ipc.IPC_EXCL | 0o600)
 
     if shmid < 0:
@@ -62,22 +103,58 @@ def setup_shm(libc):
 
     # Map shared memory into process space
     shmptr = shmat(shmid, None, 0)
-    if shmptr == 0 or shmptr == -1:
+    # shmat returns (void *) -1 on failure, an unsigned value through c_void_p
+    if not shmptr or shmptr == ctypes.c_void_p(-1).value:
         sys.exit("cannot attach shared memory segment with id %d" % (shmid))
 
+    # Built once, so later accesses don't copy the segment (unlike ctypes.string_at)
+    shm_view = np.frombuffer((ctypes.c_ubyte * size).from_address(shmptr), dtype=np.uint8)
+
     print(f'created shared memory, shmid: {shmid}')
-    return shmid, shmptr
+    return shmid, shmptr, shm_view
 
-def clear_shm(trace_bits):
+def clear_shm(trace_bits, dirty_idx=None):
     """
     Clears the coverage map in shared memory.
     
     Must be called before each execution to ensure accurate coverage tracking.
+    When the edges hit by the previous execution are known, only those bytes
+    are zeroed instead of the whole map.
+    
+    Args:
+        trace_bits (np.ndarray): uint8 view of the shared memory region to clear
+        dirty_idx (np.ndarray): Indices of the nonzero bytes left by the previous
+            execution, or None if unknown
+    """
+    if dirty_idx is None or len(dirty_idx) > MAP_SIZE // 8:
+        trace_bits.fill(0)
+    else:
+        trace_bits[dirty_idx] = 0
+
+def write_fuzz_input(fuzz_buf, data):
+    """
+    Writes a test case into the shared memory test case buffer.
     
     Args:
-        trace_bits: Pointer to shared memory region to clear
+        fuzz_buf (np.ndarray): uint8 view of the test case segment
+        data (bytes): Test case, truncated to MAX_FILE bytes
     """
-    ctypes.memset(trace_bits, 0, MAP_SIZE)
+    data = data[:MAX_FILE]
+    fuzz_buf[:4] = np.frombuffer(struct.pack('<I', len(data)), dtype=np.uint8)
+    fuzz_buf[4:4 + len(data)] = np.frombuffer(data, dtype=np.uint8)
+
+def read_fuzz_input(fuzz_buf):
+    """
+    Reads the current test case back from the shared memory test case buffer.
+    
+    Args:
+        fuzz_buf (np.ndarray): uint8 view of the test case segment
+        
+    Returns:
+        bytes: The test case
+    """
+    length = struct.unpack('<I', fuzz_buf[:4].tobytes())[0]
+    return fuzz_buf[4:4 + length].tobytes()
 
 def check_crash(status_code):
     """
@@ -102,50 +179,50 @@ def check_crash(status_code):
           * 0x80 set -> core dump generated
           * 0x0B (11) -> SIGSEGV signal
     """
-    # Dictionary of recognized crash signals
-    crash_signals = {
-        1: "SIGHUP",    # Hangup (terminal disconnected)
-        2: "SIGINT",    # Interrupt (Ctrl+C)
-        3: "SIGQUIT",   # Quit (Ctrl+\)
-        4: "SIGILL",    # Illegal instruction
-        6: "SIGABRT",   # Abort (assert failure)
-        7: "SIGBUS",    # Bus error (bad memory access)
-        8: "SIGFPE",    # Floating point exception
-        9: "SIGKILL",   # Kill (immediate termination)
-        11: "SIGSEGV",  # Segmentation fault
-        13: "SIGPIPE",  # Broken pipe
-        14: "SIGALRM",  # Alarm clock
-        15: "SIGTERM",  # Termination request
-        24: "SIGXCPU",  # CPU time limit exceeded
-        25: "SIGXFSZ",  # File size limit exceeded
-        31: "SIGSYS"    # Bad system call
-    }
-    
     # Extract core dump flag and actual signal
     is_core_dump = (status_code & 0x80) != 0  # Check high bit
     actual_signal = status_code & 0x7f         # Get low 7 bits
     
-    # Determine if status indicates a crash
-    if actual_signal in crash_signals or is_core_dump:
-        signal_name = crash_signals.get(actual_signal, "Unknown signal")
+    # Determine if status indicates a crash (one bit test against _CRASH_MASK)
+    if (_CRASH_MASK >> actual_signal) & 1 or is_core_dump:
+        signal_name = CRASH_SIGNALS.get(actual_signal, "Unknown signal")
         print(f"Found a crash! Signal: {signal_name} ({actual_signal})")
         if is_core_dump:
             print("Core dump detected!")
         return True
     return False
 
-def check_coverage(trace_bits, global_coverage):
-    raw_bitmap = ctypes.string_at(trace_bits, MAP_SIZE)
-    current_coverage = set()
-    new_edge_covered = False
+def check_coverage(trace_bits, virgin_bits):
+    """
+    Compares the coverage map of the last execution against the virgin map.
     
-    for idx, byte in enumerate(raw_bitmap):
-        if byte != 0:
-            current_coverage.add(idx)
-            
-    new_edges = current_coverage - global_coverage
-    if new_edges:
-        new_edge_covered = True
-    return new_edge_covered, current_coverage
-
-
+    Hit counts are first classified into AFL-style buckets, so an edge taken
+    a different number of times also counts as new coverage. As in AFL, the
+    virgin map starts with every bit set and a bucket's bit is cleared once it
+    has been seen, so the new buckets of an execution are a single AND and the
+    update a single XOR. The whole map is processed with vectorized NumPy
+    operations instead of a per-byte Python loop, since this runs after every
+    single execution.
+    
+    Args:
+        trace_bits (np.ndarray): uint8 view of the shared memory, shape (MAP_SIZE,)
+        virgin_bits (np.ndarray): uint8 map of the hit count buckets not seen yet
+            (initially all 0xff), updated in place with the buckets of this execution
+        
+    Returns:
+        tuple: (new_edge_covered, current_coverage, new_edge_count)
+            new_edge_covered (bool): True if a new edge or hit count bucket was hit
+            current_coverage (np.ndarray): Indices of the edges hit by this execution
+            new_edge_count (int): Number of edges that had never been hit before
+    """
+    classified = COUNT_CLASS_LOOKUP[trace_bits]
+    current_coverage = np.nonzero(classified)[0]
+    new_bits = classified & virgin_bits
+    new_edge_covered = bool(new_bits.any())
+    new_edge_count = 0
+    if new_edge_covered:
+        # Only the edges hit by this execution can be new
+        new_edge_count = int(np.count_nonzero(virgin_bits[current_coverage] == 0xff))
+        # new_bits is a subset of virgin_bits, so XOR clears exactly those bits
+        virgin_bits ^= new_bits
+    return new_edge_covered, current_coverage, new_edge_count
@@ -9,7 +9,9 @@ This module implements the core fuzzing loop and coordinates all components:
 """
 
 import argparse
+import itertools
 import signal
+import numpy as np
 from conf import *
 from libc import *
 from feedback import *
@@ -27,29 +29,39 @@ def signal_handler(sig, frame):
 
 def run_forkserver(conf, ctl_read_fd, st_write_fd):
     """
-    Sets up and runs the fork server in the target process.
+    Launches the target process, which runs the fork server.
+    
+    The target is started with posix_spawn rather than fork + exec: the child
+    only needs a few dup2/open calls before exec, which posix_spawn performs
+    as file actions, and glibc implements it with a vfork-style clone that
+    does not duplicate the fuzzer's page tables.
+    
+    The target's ends of the pipes are closed in the fuzzer afterwards, so
+    reads on the status pipe see EOF if the target exits.
     
     Args:
         conf: Fuzzer configuration
         ctl_read_fd: Control read file descriptor
         st_write_fd: Status write file descriptor
     """
-    os.dup2(ctl_read_fd, FORKSRV_FD)
-    os.dup2(st_write_fd, FORKSRV_FD + 1)
     # prepare command
     cmd = [conf['target']] + conf['target_args']
     print(cmd)
     print(f'shmid is {os.environ[SHM_ENV_VAR]}')
     print(f'st_write_fd: {st_write_fd}')
 
-    # eats stdout and stderr of the target
-    dev_null_fd = os.open(os.devnull, os.O_RDWR)
-    os.dup2(dev_null_fd, 1)
-    os.dup2(dev_null_fd, 2)
+    file_actions = [
+        (os.POSIX_SPAWN_DUP2, ctl_read_fd, FORKSRV_FD),
+        (os.POSIX_SPAWN_DUP2, st_write_fd, FORKSRV_FD + 1),
+        # eats stdout and stderr of the target
+        (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_RDWR, 0),
+        (os.POSIX_SPAWN_DUP2, 1, 2),
+    ]
+    os.posix_spawn(conf['target'], cmd, os.environ, file_actions=file_actions)
+    os.close(ctl_read_fd)
+    os.close(st_write_fd)
 
-    os.execv(conf['target'], cmd)
-
-def run_fuzzing(conf, st_read_fd, ctl_write_fd, trace_bits):
+def run_fuzzing(conf, st_read_fd, ctl_write_fd, trace_bits, fuzz_buf=None):
     """
     Main fuzzing loop implementation.
     
@@ -57,72 +69,81 @@ def run_fuzzing(conf, st_read_fd, ctl_write_fd, trace_bits):
         conf: Fuzzer configuration
         st_read_fd: Status read file descriptor
         ctl_write_fd: Control write file descriptor
-        trace_bits: Shared memory for coverage feedback
+        trace_bits: NumPy uint8 view of the shared memory for coverage feedback
+        fuzz_buf: Shared memory test case buffer, or None to pass inputs by file
     """
-    read_bytes = os.read(st_read_fd, 4)
-    if len(read_bytes) == 4:
-        print("Forkserver is up! Starting fuzzing... Press Ctrl+C to stop.")
+    init_forkserver(ctl_write_fd, st_read_fd, fuzz_buf is not None)
+    print("Forkserver is up! Starting fuzzing... Press Ctrl+C to stop.")
 
     seed_queue = []
-    global_coverage = set()
-    edge_to_seeds = {}  # Mapping from edge to list of seeds covering it
-    cycle_count = 0
-    seeds_used_in_cycle = set()
+    seed_table = SeedTable()  # Per-seed metadata arrays, indexed by seed_id
+    virgin_bits = np.full(MAP_SIZE, 0xff, dtype=np.uint8)  # Hit count buckets not seen yet per edge
+    covered_edges = 0  # Number of edges hit so far, updated incrementally
+    edge_to_seeds = [[] for _ in range(MAP_SIZE)]  # Seeds covering each edge, indexed by edge
     seed_queue_length = 0  # Initialize seed queue length
 
     total_exec_time = 0.0
     exec_count = 0
+    last_hit_idx = None  # Edges hit by the last checked execution, cleared lazily
+    timed_out = False  # Whether the last execution was killed on timeout
 
     # Do the dry run and initialize the seed queue
     shutil.copytree(conf['seeds_folder'], conf['queue_folder'])
     seed_files = os.listdir(conf['queue_folder'])
-    for i, seed_file in enumerate(seed_files):
+    for seed_file in seed_files:
         seed_path = os.path.join(conf['queue_folder'], seed_file)
-        shutil.copyfile(seed_path, conf['current_input'])
-        status_code, exec_time = run_target(ctl_write_fd, st_read_fd, trace_bits)
-        if status_code == 9:
+        if fuzz_buf is not None:
+            with open(seed_path, 'rb') as f:
+                write_fuzz_input(fuzz_buf, f.read())
+        else:
+            shutil.copyfile(seed_path, conf['current_input'])
+        status_code, exec_time, timed_out = run_target(ctl_write_fd, st_read_fd, trace_bits,
+                                                       last_hit_idx, timed_out)
+        last_hit_idx = None
+        # Timeouts and crashes are skipped before the coverage map is scanned;
+        # last_hit_idx stays None so the next run clears the whole map
+        if timed_out:
             print(f"Seed {seed_file} caused a timeout during the dry run")
             continue
         if check_crash(status_code):
             print(f"Seed {seed_file} caused a crash during the dry run")
             continue
-        new_edge_covered, seed_coverage = check_coverage(trace_bits, global_coverage)
-        global_coverage.update(seed_coverage)
+        new_edge_covered, seed_coverage, new_edge_count = check_coverage(trace_bits, virgin_bits)
+        covered_edges += new_edge_count
+        last_hit_idx = seed_coverage
         # Update edge_to_seeds mapping
-        for edge in seed_coverage:
-            if edge not in edge_to_seeds:
-                edge_to_seeds[edge] = []
-            edge_to_seeds[edge].append(i)
-        coverage = len(global_coverage)
-        new_seed = Seed(seed_path, i, seed_coverage, exec_time)
+        seed_id = len(seed_queue)
+        for edge in seed_coverage.tolist():
+            edge_to_seeds[edge].append(seed_id)
+        new_seed = Seed(seed_path, seed_id, seed_coverage, exec_time)
         seed_queue.append(new_seed)
+        seed_table.add(new_seed)
         total_exec_time += exec_time
         exec_count += 1
     # Calculate average execution time
     avg_exec_time = total_exec_time / exec_count if exec_count > 0 else 0.1
 
     # Update favored seeds after dry run
-    update_favored_seeds(seed_queue, edge_to_seeds)
+    update_favored_seeds(seed_queue, seed_table, edge_to_seeds)
 
-    print(f"Dry run finished. Initial coverage: {len(global_coverage)} edges.")
+    print(f"Dry run finished. Initial coverage: {covered_edges} edges.")
 
     # Initialize cycle tracking
-    seeds_used_in_cycle = set()
-    cycle_seed_count = len(seed_queue)
+    scheduler = SeedScheduler(seed_queue)
     cycle_count = 0
     
-    mutation_strategy = MutationStrategy(conf)
+    mutation_strategy = MutationStrategy(conf, fuzz_buf)
     
     while True:
-        # Select next seed using the new function
-        selected_seed, seeds_used_in_cycle, cycle_seed_count, new_cycle = \
-            select_next_seed(seed_queue, seeds_used_in_cycle, cycle_seed_count)
+        # Select next seed
+        selected_seed, new_cycle = scheduler.select_next_seed()
             
         if new_cycle:
             cycle_count += 1
             print(f"Starting new cycle {cycle_count}")
             # Update favored seeds at the beginning of each cycle
-            update_favored_seeds(seed_queue, edge_to_seeds)
+            update_favored_seeds(seed_queue, seed_table, edge_to_seeds)
+            scheduler.refresh_favored()
             
         if not selected_seed:
             print("No seeds available!")
@@ -139,40 +160,59 @@ def run_fuzzing(conf, st_read_fd, ctl_write_fd, trace_bits):
             else:
                 mutation_strategy.splice_mutator.mutate(selected_seed, seed_queue)
             
-            status_code, exec_time = run_target(ctl_write_fd, st_read_fd, trace_bits)
+            status_code, exec_time, timed_out = run_target(ctl_write_fd, st_read_fd, trace_bits,
+                                                           last_hit_idx, timed_out)
+            last_hit_idx = None
             total_exec_time += exec_time
             exec_count += 1
             avg_exec_time = total_exec_time / exec_count
             
-            if status_code == 9:
+            # Only clean exits reach check_coverage (see the dry run above)
+            if timed_out:
                 print("Timeout, skipping this input")
                 continue
                 
             if check_crash(status_code):
-                crash_path = save_crash_input(conf, selected_seed.path, status_code)
+                crash_path = save_crash_input(conf, selected_seed.path, status_code, fuzz_buf)
                 print(f"Crash saved to {crash_path}")
                 # Update mutation strategy with crash information
                 mutation_strategy.update_rewards(operator, 0, crashed=True)
                 continue
-            new_edge_covered, seed_coverage = check_coverage(trace_bits, global_coverage)
+            new_edge_covered, seed_coverage, new_edge_count = check_coverage(trace_bits, virgin_bits)
+            last_hit_idx = seed_coverage
             if new_edge_covered:
-                print(f"Found new coverage! Total coverage: {len(global_coverage)} edges.")
-                global_coverage.update(seed_coverage)
+                covered_edges += new_edge_count
+                print(f"Found new coverage! Total coverage: {covered_edges} edges.")
                 # Update edge_to_seeds mapping
                 seed_id = len(seed_queue)
-                for edge in seed_coverage:
-                    if edge not in edge_to_seeds:
-                        edge_to_seeds[edge] = []
+                for edge in seed_coverage.tolist():
                     edge_to_seeds[edge].append(seed_id)
                 # Save new seed
                 new_seed_path = os.path.join(conf['queue_folder'], f'id_{seed_id}')
-                shutil.copyfile(conf['current_input'], new_seed_path)
+                save_current_input(conf, new_seed_path, fuzz_buf)
                 new_seed = Seed(new_seed_path, seed_id, seed_coverage, exec_time)
                 seed_queue.append(new_seed)
+                seed_table.add(new_seed)
+                scheduler.add_seed(new_seed)
                 seed_queue_length += 1
-                mutation_strategy.update_rewards(operator, len(seed_coverage - global_coverage))
+                mutation_strategy.update_rewards(operator, new_edge_count)
+
+def save_current_input(conf, dest_path, fuzz_buf=None):
+    """
+    Save the input of the last execution to dest_path.
+    
+    Args:
+        conf: Fuzzer configuration
+        dest_path: Path to write the input to
+        fuzz_buf: Shared memory test case buffer, or None if inputs are passed by file
+    """
+    if fuzz_buf is not None:
+        with open(dest_path, 'wb') as f:
+            f.write(read_fuzz_input(fuzz_buf))
+    else:
+        shutil.copyfile(conf['current_input'], dest_path)
 
-def save_crash_input(conf, seed_path=None, status_code=None):
+def save_crash_input(conf, seed_path=None, status_code=None, fuzz_buf=None):
     """
     Save crash-triggering input to crashes folder.
     
@@ -180,6 +220,7 @@ def save_crash_input(conf, seed_path=None, status_code=None):
         conf: Fuzzer configuration
         seed_path: Path to seed that led to crash
         status_code: Exit status of crashed program
+        fuzz_buf: Shared memory test case buffer, or None if inputs are passed by file
     """
     timestamp = int(time.time())
     if seed_path:
@@ -189,28 +230,28 @@ def save_crash_input(conf, seed_path=None, status_code=None):
         crash_filename = f"crash_{timestamp}"
     
     crash_path = os.path.join(conf['crashes_folder'], crash_filename)
-    shutil.copyfile(conf['current_input'], crash_path)
+    save_current_input(conf, crash_path, fuzz_buf)
     return crash_path
 
-def update_favored_seeds(seed_queue, edge_to_seeds):
+def update_favored_seeds(seed_queue, seed_table, edge_to_seeds):
     """
     Update which seeds are marked as favored based on coverage.
     
     Args:
         seed_queue: List of all seeds
-        edge_to_seeds: Mapping of edges to seeds covering them
+        seed_table: SeedTable holding the metadata of all seeds
+        edge_to_seeds: Lists of seeds covering each edge, indexed by edge
     """
-    # Reset favored status
-    for seed in seed_queue:
-        seed.unmark_favored()
+    # Flatten the covered edges into CSR form (indptr, indices)
+    seed_lists = [seed_ids for seed_ids in edge_to_seeds if seed_ids]
+    indptr = np.zeros(len(seed_lists) + 1, dtype=np.int64)
+    np.cumsum([len(seed_ids) for seed_ids in seed_lists], out=indptr[1:])
+    indices = np.fromiter(itertools.chain.from_iterable(seed_lists), dtype=np.int64, count=indptr[-1])
     # For each edge, find the seed with minimal (exec_time * file_size)
-    for edge, seed_ids in edge_to_seeds.items():
-        # Get the seeds covering this edge
-        seeds = [seed_queue[seed_id] for seed_id in seed_ids]
-        # Sort seeds by (exec_time * file_size)
-        seeds.sort(key=lambda s: s.get_valuation())
-        # Mark the first seed as favored
-        seeds[0].mark_favored()
+    favored = seed_table.update_favored(indptr, indices)
+    # Copy the flags to the seeds used by the scheduler
+    for seed, is_favored in zip(seed_queue, favored.tolist()):
+        seed.favored = is_favored
 
 def main():
     """Entry point for Mini-Lop fuzzer"""
@@ -229,12 +270,18 @@ def main():
 
     libc = get_libc()
 
-    shmid, trace_bits = setup_shm(libc)
+    shmid, _, trace_bits = setup_shm(libc)
     # share the shmid with the target via an environment variable
     os.environ[SHM_ENV_VAR] = str(shmid)
     # clean the shared memory
     clear_shm(trace_bits)
 
+    fuzz_buf = None
+    if conf['shm_fuzz']:
+        # second segment for passing test cases to the target
+        fuzz_shmid, _, fuzz_buf = setup_shm(libc, SHM_FUZZ_MAP_SIZE)
+        os.environ[SHM_FUZZ_ENV_VAR] = str(fuzz_shmid)
+
     signal.signal(signal.SIGINT, signal_handler)
 
     # setup pipes for communication
@@ -242,12 +289,8 @@ def main():
     (st_read_fd, st_write_fd) = os.pipe()
     (ctl_read_fd, ctl_write_fd) = os.pipe()
 
-    child_pid = os.fork()
-
-    if child_pid == 0:
-        run_forkserver(conf, ctl_read_fd, st_write_fd)
-    else:
-        run_fuzzing(conf, st_read_fd, ctl_write_fd, trace_bits)
+    run_forkserver(conf, ctl_read_fd, st_write_fd)
+    run_fuzzing(conf, st_read_fd, ctl_write_fd, trace_bits, fuzz_buf)
 
 if __name__ == '__main__':
     main()
@@ -7,12 +7,34 @@ This module implements various mutation strategies for test case generation:
 3. Mutation Strategy: Manages and selects between different mutation operators
 
 The mutation operators are designed to generate new test inputs that might trigger
-different program behaviors, crashes, or increase code coverage.
+different program behaviors, crashes, or increase code coverage. When Numba is
+installed, the havoc operators run compiled from mutation_core.
 """
 
 import random
-import struct
+import re
 import os
+import numpy as np
+from feedback import write_fuzz_input
+from mutation_core import HAVE_NUMBA, NUM_OPS, do_havoc
+
+# Parsed dictionaries, keyed by file path, shared by all mutators
+_DICT_CACHE = {}
+
+# First quoted token of every non-comment line, quotes may be escaped inside
+_DICT_TOKEN_RE = re.compile(rb'^[^#\n]*?"((?:[^"\\\n]|\\.)*)"', re.MULTILINE)
+# AFL dictionary escapes: \\, \" and \xNN
+_DICT_ESCAPE_RE = re.compile(rb'\\(x[0-9a-fA-F]{2}|.)', re.DOTALL)
+
+# Havoc mutations sampled per refill of HavocMutator's random number block
+HAVOC_RAND_BLOCK = 4096
+
+def _unescape_token(match):
+    """Replacement function for _DICT_ESCAPE_RE"""
+    escaped = match.group(1)
+    if len(escaped) == 3:
+        return bytes([int(escaped[1:], 16)])
+    return escaped
 
 INTERESTING_16 = [
     0, -32768, 32767, -1, 1,  # Min/max values for 16-bit integers
@@ -46,7 +68,7 @@ class HavocMutator:
     - Arithmetic operations
     """
     
-    def __init__(self, conf):
+    def __init__(self, conf, fuzz_buf=None):
         """
         Initialize the havoc mutator.
         
@@ -54,9 +76,26 @@ class HavocMutator:
             conf (dict): Configuration dictionary containing:
                 - dictionary_file: Path to mutation dictionary
                 - current_input: Path to write mutated inputs
+            fuzz_buf (np.ndarray): Shared memory test case buffer, if mutated
+                inputs are passed to the target through shared memory
         """
         self.conf = conf
+        self.fuzz_buf = fuzz_buf
+        self._input_fd = None  # Kept open so each write is just pwrite + ftruncate
         self.dictionary = self.load_dictionary(conf.get('dictionary_file'))
+        self._rng = np.random.default_rng()
+        self._rand_rows = 0  # Rows in the random number block, filled on first use
+        self._rand_next = 0  # First row not handed out yet
+        if HAVE_NUMBA:
+            # Dictionary as flat arrays for do_havoc, and a reusable input buffer
+            self._tokens = np.frombuffer(b''.join(self.dictionary), dtype=np.uint8).copy()
+            self._token_offsets = np.cumsum([0] + [len(token) for token in self.dictionary], dtype=np.int64)
+            self._max_token_len = max(map(len, self.dictionary), default=0)
+            self._buf = np.empty(0, dtype=np.uint8)
+        # Mutation operators indexed by operator id (mutation_core.OP_*)
+        self._ops = (self.bit_flip_mutation, self.integer_mutation, self.interesting_value_mutation,
+                     self.chunk_replacement_mutation, self.dictionary_insert_mutation,
+                     self.dictionary_replace_mutation, self.arithmetic_mutation)
         
     def load_dictionary(self, dict_file):
         """
@@ -71,21 +110,19 @@ class HavocMutator:
         Notes:
             Dictionary format:
             - Lines starting with '#' are ignored
-            - Tokens are enclosed in quotes
+            - Tokens are enclosed in quotes, with AFL-style backslash escapes
             - Empty lines are skipped
+            - Files are parsed with a single regex scan and cached per path
         """
         if not dict_file or not os.path.exists(dict_file):
             return []
         
-        tokens = []
-        with open(dict_file, 'rb') as f:
-            for line in f:
-                if line.startswith(b'#') or not line.strip():
-                    continue
-                if b'"' in line:
-                    token = line.split(b'"')[1]
-                    tokens.append(token)
-        return tokens
+        if dict_file not in _DICT_CACHE:
+            with open(dict_file, 'rb') as f:
+                buf = f.read()
+            _DICT_CACHE[dict_file] = [_DICT_ESCAPE_RE.sub(_unescape_token, token)
+                                      for token in _DICT_TOKEN_RE.findall(buf)]
+        return _DICT_CACHE[dict_file]
 
     def mutate(self, seed):
         """
@@ -97,139 +134,223 @@ class HavocMutator:
         Notes:
             - Number of mutations scales with input size
             - Mutations are applied randomly
-            - Result is written to conf['current_input']
+            - Result is written to conf['current_input'] (or the shared memory buffer)
+        """
+        self.write_input(self.havoc(seed.data))
+
+    def havoc(self, data):
         """
-        with open(seed.path, 'rb') as f:
-            data = bytearray(f.read())
+        Apply a random number of havoc mutations to a copy of data.
+        
+        Args:
+            data (bytes): Input data to mutate
             
+        Returns:
+            Bytes-like mutated input. With Numba this is a view of a buffer
+            reused by the next call, so it must be written out first.
+        """
         if len(data) < 8:
-            return
+            return data
             
-        num_mutations = random.randint(1, max(4, len(data) // 100))
+        start, count = self.take_mutations(max(4, len(data) // 100))
+        
+        if HAVE_NUMBA:
+            return self.compiled_havoc(data, start, count)
+        
+        data = bytearray(data)
+        ops = self._ops
+        choices, positions, values = self._choice_list, self._position_list, self._value_list
+        for i in range(start, start + count):
+            ops[choices[i]](data, positions[i], values[i])
+        return data
+
+    def refill_random(self, min_rows):
+        """
+        Sample the random numbers of a whole block of havoc mutations at once.
         
-        for _ in range(num_mutations):
-            mutation_choice = random.randint(0, 6)
+        A single Generator.integers call per block: each call costs several
+        microseconds, more than a whole havoc pass on a small input.
+        
+        Args:
+            min_rows (int): Rows needed by the pass that ran out of random numbers
             
-            if mutation_choice == 0:
-                self.bit_flip_mutation(data)
-            elif mutation_choice == 1:
-                self.integer_mutation(data)
-            elif mutation_choice == 2:
-                self.interesting_value_mutation(data)
-            elif mutation_choice == 3:
-                self.chunk_replacement_mutation(data)
-            elif mutation_choice == 4:
-                self.dictionary_insert_mutation(data)
-            elif mutation_choice == 5:
-                self.dictionary_replace_mutation(data)
-            else:
-                self.arithmetic_mutation(data)
-                
-        with open(self.conf['current_input'], 'wb') as f:
-            f.write(data)
+        Notes:
+            Block columns: mutation count, operator id, three non-negative ints
+            for widths, offsets and table picks (reduced modulo the current
+            length), and a full range int64 value or delta
+        """
+        rows = max(HAVOC_RAND_BLOCK, min_rows)
+        block = self._rng.integers(-(1 << 63), (1 << 63) - 1, size=(rows, 6), dtype=np.int64, endpoint=True)
+        block[:, :5] &= 0x7fffffff
+        block[:, 1] %= NUM_OPS
+        self._counts = block[:, 0].tolist()
+        if HAVE_NUMBA:
+            self._choices = block[:, 1].copy()
+            self._positions = block[:, 2:5].copy()
+            self._values = block[:, 5].copy()
+        else:
+            self._choice_list = block[:, 1].tolist()
+            self._position_list = block[:, 2:5].tolist()
+            self._value_list = block[:, 5].tolist()
+        self._rand_rows = rows
+        self._rand_next = 0
+
+    def take_mutations(self, max_mutations):
+        """
+        Hand out the random numbers of 1 to max_mutations havoc mutations.
+        
+        Args:
+            max_mutations (int): Upper bound on the number of mutations
+            
+        Returns:
+            tuple: (start, count), the block rows to apply
+        """
+        start = self._rand_next
+        if start + max_mutations > self._rand_rows:
+            self.refill_random(max_mutations)
+            start = 0
+        count = 1 + self._counts[start] % max_mutations
+        self._rand_next = start + count
+        return start, count
+
+    def compiled_havoc(self, data, start, count):
+        """
+        Apply a batch of sampled havoc mutations using the compiled operators.
+        
+        Args:
+            data (bytes): Input data
+            start, count: Block rows from take_mutations
+            
+        Returns:
+            np.ndarray: View of the mutated input in self._buf
+            
+        Notes:
+            - The whole pass, dictionary operators included, is one do_havoc call
+            - The input is copied once into a buffer owned by the mutator; Numba
+              never sees a view of a resizable bytearray
+        """
+        length = len(data)
+        needed = length + count * self._max_token_len
+        if len(self._buf) < needed:
+            self._buf = np.empty(max(needed, 2 * len(self._buf)), dtype=np.uint8)
+        buf = self._buf
+        buf[:length] = np.frombuffer(data, dtype=np.uint8)
+        length = do_havoc(buf, length, self._choices, self._positions, self._values, start, count,
+                          self._tokens, self._token_offsets)
+        return buf[:length]
 
-    def bit_flip_mutation(self, data):
+    def write_input(self, data):
+        """Hand a mutated input to the target via shared memory or conf['current_input']"""
+        if self.fuzz_buf is not None:
+            write_fuzz_input(self.fuzz_buf, data)
+            return
+        if self._input_fd is None:
+            self._input_fd = os.open(self.conf['current_input'], os.O_WRONLY | os.O_CREAT, 0o600)
+        # Overwrite in place: two syscalls instead of open/fstat/write/close
+        os.pwrite(self._input_fd, data, 0)
+        os.ftruncate(self._input_fd, len(data))
+
+    def bit_flip_mutation(self, data, pos, value):
         """Flip random bits in the data"""
-        idx = random.randint(0, len(data) - 1)
-        bit_pos = random.randint(0, 7)
+        idx = pos[1] % len(data)
+        bit_pos = pos[0] % 8
         data[idx] ^= (1 << bit_pos)
 
-    def integer_mutation(self, data):
+    def integer_mutation(self, data, pos, value):
         """Mutate 2/4/8 byte integers with random values"""
-        sizes = [(2, '<h', -32768, 32767),
-                (4, '<i', -2147483648, 2147483647),
-                (8, '<q', -9223372036854775808, 9223372036854775807)]
+        sizes = (2, 4, 8)
         
-        size, fmt, min_val, max_val = random.choice(sizes)
+        size = sizes[pos[0] % 3]
         if len(data) < size:
             return
             
-        idx = random.randint(0, len(data) - size)
-        value = random.randint(min_val, max_val)
-        struct.pack_into(fmt, data, idx, value)
+        idx = pos[1] % (len(data) - size + 1)
+        # Low size bytes of the random value, as mutation_core.integer_mut writes them
+        data[idx:idx + size] = (value & ((1 << (8 * size)) - 1)).to_bytes(size, 'little')
 
-    def interesting_value_mutation(self, data):
+    def interesting_value_mutation(self, data, pos, value):
         """Replace integers with interesting values"""
         sizes = [
-            (2, '<h', [-32768, 32767, -1, 0, 1, -128, 127, 255, -256, 256, 65535 & 0x7fff]),
-            (4, '<i', INTERESTING_32),
-            (8, '<q', INTERESTING_64)
+            (2, [-32768, 32767, -1, 0, 1, -128, 127, 255, -256, 256, 65535 & 0x7fff]),
+            (4, INTERESTING_32),
+            (8, INTERESTING_64)
         ]
         
-        size, fmt, interesting_vals = random.choice(sizes)
+        size, interesting_vals = sizes[pos[0] % 3]
         if len(data) < size:
             return
             
-        idx = random.randint(0, len(data) - size)
-        value = random.choice(interesting_vals)
+        idx = pos[1] % (len(data) - size + 1)
+        value = interesting_vals[pos[2] % len(interesting_vals)]
         
         try:
-            struct.pack_into(fmt, data, idx, value)
-        except struct.error:
-            # If value is too large for the format, use a bounded value
+            data[idx:idx + size] = value.to_bytes(size, 'little', signed=True)
+        except OverflowError:
+            # If value is too large for the size, use a bounded value
             if value > 0:
-                struct.pack_into(fmt, data, idx, (1 << (size * 8 - 1)) - 1)  # Max positive
+                value = (1 << (size * 8 - 1)) - 1  # Max positive
             else:
-                struct.pack_into(fmt, data, idx, -(1 << (size * 8 - 1)))     # Max negative
+                value = -(1 << (size * 8 - 1))     # Max negative
+            data[idx:idx + size] = value.to_bytes(size, 'little', signed=True)
 
-    def chunk_replacement_mutation(self, data):
+    def chunk_replacement_mutation(self, data, pos, value):
         """Replace a chunk of bytes with another chunk from the same file"""
         if len(data) < 4:
             return
             
-        chunk_size = random.randint(2, min(32, len(data) // 2))
-        src_pos = random.randint(0, len(data) - chunk_size)
-        dst_pos = random.randint(0, len(data) - chunk_size)
+        chunk_size = 2 + pos[0] % (min(32, len(data) // 2) - 1)
+        src_pos = pos[1] % (len(data) - chunk_size + 1)
+        dst_pos = pos[2] % (len(data) - chunk_size + 1)
         
         chunk = data[src_pos:src_pos + chunk_size]
         data[dst_pos:dst_pos + chunk_size] = chunk
 
-    def arithmetic_mutation(self, data):
+    def arithmetic_mutation(self, data, pos, value):
         """Perform arithmetic operations on integers"""
-        sizes = [(2, '<h', -256, 256),
-                (4, '<i', -65536, 65536),
-                (8, '<q', -4294967296, 4294967296)]
+        sizes = [(2, -256, 256),
+                (4, -65536, 65536),
+                (8, -4294967296, 4294967296)]
         
-        size, fmt, min_delta, max_delta = random.choice(sizes)
+        size, min_delta, max_delta = sizes[pos[0] % 3]
         if len(data) < size:
             return
             
-        idx = random.randint(0, len(data) - size)
-        value = struct.unpack_from(fmt, data, idx)[0]
-        delta = random.randint(min_delta, max_delta)
+        idx = pos[1] % (len(data) - size + 1)
+        delta = min_delta + value % (max_delta - min_delta + 1)
+        value = int.from_bytes(data[idx:idx + size], 'little', signed=True)
         
         try:
-            struct.pack_into(fmt, data, idx, value + delta)
-        except struct.error:
+            data[idx:idx + size] = (value + delta).to_bytes(size, 'little', signed=True)
+        except OverflowError:
             # If overflow occurs, wrap around
             if delta > 0:
-                struct.pack_into(fmt, data, idx, min_delta)
+                data[idx:idx + size] = min_delta.to_bytes(size, 'little', signed=True)
             else:
-                struct.pack_into(fmt, data, idx, max_delta)
+                data[idx:idx + size] = max_delta.to_bytes(size, 'little', signed=True)
 
-    def dictionary_insert_mutation(self, data):
+    def dictionary_insert_mutation(self, data, pos, value):
         """Insert dictionary token at random position"""
         if not self.dictionary:
             return
             
-        token = random.choice(self.dictionary)
+        token = self.dictionary[pos[0] % len(self.dictionary)]
         if len(data) < 2:
             data.extend(token)
         else:
-            pos = random.randint(0, len(data) - 1)
-            data[pos:pos] = token
+            insert_pos = pos[1] % len(data)
+            data[insert_pos:insert_pos] = token
 
-    def dictionary_replace_mutation(self, data):
+    def dictionary_replace_mutation(self, data, pos, value):
         """Replace bytes with dictionary token"""
         if not self.dictionary or len(data) < 2:
             return
             
-        token = random.choice(self.dictionary)
+        token = self.dictionary[pos[0] % len(self.dictionary)]
         if len(token) > len(data):
             return
             
-        pos = random.randint(0, len(data) - len(token))
-        data[pos:pos + len(token)] = token
+        replace_pos = pos[1] % (len(data) - len(token) + 1)
+        data[replace_pos:replace_pos + len(token)] = token
 
 class SpliceMutator:
     """
@@ -241,15 +362,16 @@ class SpliceMutator:
     3. Applies havoc mutations to the result
     """
     
-    def __init__(self, conf):
+    def __init__(self, conf, fuzz_buf=None):
         """
         Initialize splice mutator.
         
         Args:
             conf (dict): Configuration dictionary
+            fuzz_buf (np.ndarray): Shared memory test case buffer, or None
         """
         self.conf = conf
-        self.havoc_mutator = HavocMutator(conf)
+        self.havoc_mutator = HavocMutator(conf, fuzz_buf)
         
     def mutate(self, seed, seed_queue):
         """
@@ -271,11 +393,9 @@ class SpliceMutator:
         other_seeds = [s for s in seed_queue if s.seed_id != seed.seed_id]
         other_seed = random.choice(other_seeds)
         
-        # Read both seeds
-        with open(seed.path, 'rb') as f:
-            data1 = bytearray(f.read())
-        with open(other_seed.path, 'rb') as f:
-            data2 = bytearray(f.read())
+        # Use the cached contents of both seeds
+        data1 = seed.data
+        data2 = other_seed.data
             
         if len(data1) < 4 or len(data2) < 4:
             return self.havoc_mutator.mutate(seed)
@@ -286,13 +406,9 @@ class SpliceMutator:
         
         # Create spliced data
         spliced_data = data1[:split_point1] + data2[split_point2:]
-        
-        # Write spliced data
-        with open(self.conf['current_input'], 'wb') as f:
-            f.write(spliced_data)
             
-        # Apply havoc mutations to spliced data
-        self.havoc_mutator.mutate(seed)
+        # Apply havoc mutations to spliced data and write the result
+        self.havoc_mutator.write_input(self.havoc_mutator.havoc(spliced_data))
 
 class MutationStrategy:
     """
@@ -304,15 +420,16 @@ class MutationStrategy:
     3. Balances exploration and exploitation
     """
     
-    def __init__(self, conf):
+    def __init__(self, conf, fuzz_buf=None):
         """
         Initialize mutation strategy.
         
         Args:
             conf (dict): Configuration dictionary
+            fuzz_buf (np.ndarray): Shared memory test case buffer, or None
         """
-        self.havoc_mutator = HavocMutator(conf)
-        self.splice_mutator = SpliceMutator(conf)
+        self.havoc_mutator = HavocMutator(conf, fuzz_buf)
+        self.splice_mutator = SpliceMutator(conf, fuzz_buf)
         self.epsilon = 0.1  # Exploration rate
         
         # Performance tracking
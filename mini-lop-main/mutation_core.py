@@ -0,0 +1,225 @@
+"""
+mutation_core.py - Compiled Havoc Operators for Mini-Lop Fuzzer
+
+This module implements the havoc mutations (bit flips, integer, interesting
+value, chunk replacement, dictionary and arithmetic mutations) as Numba
+compiled functions working on a uint8 NumPy array:
+1. All randomness is sampled up-front by the caller as integer arrays
+2. do_havoc applies a whole havoc pass in a single compiled loop
+3. Dictionary insertions grow the input inside a buffer sized by the caller
+
+Numba is optional. Without it HAVE_NUMBA is False and HavocMutator uses its
+pure Python operators instead.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """Fallback decorator keeping this module importable without Numba"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# Mutation operator ids, shared with HavocMutator.mutate
+OP_BIT_FLIP = 0
+OP_INTEGER = 1
+OP_INTERESTING = 2
+OP_CHUNK_REPLACE = 3
+OP_DICT_INSERT = 4
+OP_DICT_REPLACE = 5
+OP_ARITHMETIC = 6
+NUM_OPS = 7
+
+# Same values as the Python operators in mutation.py
+INTERESTING_16 = np.array([-32768, 32767, -1, 0, 1, -128, 127, 255, -256, 256, 32767], dtype=np.int64)
+INTERESTING_32 = np.array([0, -2147483648, 2147483647, -1, 1, -32768, 32767, -65536, 65535,
+                           -100663046, 100663046], dtype=np.int64)
+INTERESTING_64 = np.array([0, -1, 1, -4294967296, 4294967296, -2147483648, 2147483647,
+                           9223372036854775807, -9223372036854775808], dtype=np.int64)
+
+
+@njit(cache=True)
+def _int_size(size_sel):
+    """Pick a 2, 4 or 8 byte integer width"""
+    return 2 << (size_sel % 3)
+
+
+@njit(cache=True)
+def _int_bounds(size):
+    """Signed range of a size-byte integer"""
+    if size == 2:
+        return -32768, 32767
+    if size == 4:
+        return -2147483648, 2147483647
+    return -9223372036854775808, 9223372036854775807
+
+
+@njit(cache=True)
+def _read_int(buf, idx, size):
+    """Read a signed little-endian integer"""
+    value = 0
+    for k in range(size):
+        value |= np.int64(buf[idx + k]) << (8 * k)
+    if size < 8 and value >= (1 << (8 * size - 1)):
+        value -= 1 << (8 * size)
+    return value
+
+
+@njit(cache=True)
+def _write_int(buf, idx, size, value):
+    """Write the low size bytes of value in little-endian order"""
+    for k in range(size):
+        buf[idx + k] = (value >> (8 * k)) & 0xFF
+
+
+@njit(cache=True)
+def bit_flip(buf, pos, bit):
+    """Flip one bit of a random byte"""
+    buf[pos % len(buf)] ^= 1 << (bit % 8)
+
+
+@njit(cache=True)
+def integer_mut(buf, size_sel, pos, value):
+    """Overwrite a 2/4/8 byte integer with a random value"""
+    size = _int_size(size_sel)
+    if len(buf) < size:
+        return
+    _write_int(buf, pos % (len(buf) - size + 1), size, value)
+
+
+@njit(cache=True)
+def interesting_val(buf, size_sel, pos, pick):
+    """Overwrite a 2/4/8 byte integer with an interesting value"""
+    size = _int_size(size_sel)
+    if len(buf) < size:
+        return
+    if size == 2:
+        value = INTERESTING_16[pick % len(INTERESTING_16)]
+    elif size == 4:
+        value = INTERESTING_32[pick % len(INTERESTING_32)]
+    else:
+        value = INTERESTING_64[pick % len(INTERESTING_64)]
+    _write_int(buf, pos % (len(buf) - size + 1), size, value)
+
+
+@njit(cache=True)
+def chunk_replace(buf, size_sel, src, dst):
+    """Copy a chunk of 2-32 bytes to another position in the same input"""
+    if len(buf) < 4:
+        return
+    chunk_size = 2 + size_sel % (min(32, len(buf) // 2) - 1)
+    src_pos = src % (len(buf) - chunk_size + 1)
+    dst_pos = dst % (len(buf) - chunk_size + 1)
+    buf[dst_pos:dst_pos + chunk_size] = buf[src_pos:src_pos + chunk_size].copy()
+
+
+@njit(cache=True)
+def arith_mut(buf, size_sel, pos, delta_sel):
+    """Add a random delta to a 2/4/8 byte integer"""
+    size = _int_size(size_sel)
+    if len(buf) < size:
+        return
+    if size == 2:
+        max_delta = 256
+    elif size == 4:
+        max_delta = 65536
+    else:
+        max_delta = 4294967296
+    idx = pos % (len(buf) - size + 1)
+    delta = delta_sel % (2 * max_delta + 1) - max_delta
+    value = _read_int(buf, idx, size)
+    low, high = _int_bounds(size)
+    if delta > 0 and value > high - delta:
+        # If overflow occurs, wrap around
+        _write_int(buf, idx, size, -max_delta)
+    elif delta < 0 and value < low - delta:
+        _write_int(buf, idx, size, max_delta)
+    else:
+        _write_int(buf, idx, size, value + delta)
+
+
+@njit(cache=True)
+def dict_insert(buf, length, tokens, token_offsets, pick, pos):
+    """Insert a dictionary token at a random position, returns the new length"""
+    num_tokens = len(token_offsets) - 1
+    if num_tokens == 0:
+        return length
+    token = pick % num_tokens
+    token_start = token_offsets[token]
+    token_len = token_offsets[token + 1] - token_start
+    insert_pos = length if length < 2 else pos % length
+    # The source and destination of the tail overlap, so shift it through a
+    # copy. Plain loops over the views vectorize; slice assignment and
+    # .copy() were over 30x slower on large inputs
+    src = buf[insert_pos:length]
+    dst = buf[insert_pos + token_len:length + token_len]
+    tail = np.empty(len(src), dtype=np.uint8)
+    for k in range(len(src)):
+        tail[k] = src[k]
+    for k in range(len(src)):
+        dst[k] = tail[k]
+    buf[insert_pos:insert_pos + token_len] = tokens[token_start:token_start + token_len]
+    return length + token_len
+
+
+@njit(cache=True)
+def dict_replace(buf, length, tokens, token_offsets, pick, pos):
+    """Overwrite bytes with a dictionary token"""
+    num_tokens = len(token_offsets) - 1
+    if num_tokens == 0 or length < 2:
+        return
+    token = pick % num_tokens
+    token_start = token_offsets[token]
+    token_len = token_offsets[token + 1] - token_start
+    if token_len > length:
+        return
+    replace_pos = pos % (length - token_len + 1)
+    buf[replace_pos:replace_pos + token_len] = tokens[token_start:token_start + token_len]
+
+
+@njit(cache=True)
+def do_havoc(buf, length, choices, positions, values, start, count, tokens, token_offsets):
+    """
+    Apply one havoc pass in place.
+
+    Args:
+        buf (np.ndarray): uint8 buffer holding the input in buf[:length], with
+            room for count insertions of the longest token
+        length (int): Input length
+        choices (np.ndarray): Operator id per mutation (OP_*)
+        positions (np.ndarray): Non-negative random ints, shape (n, 3), used
+            for widths, offsets and table picks
+        values (np.ndarray): Full range random int64 values, shape (n,), used
+            for integer values and arithmetic deltas
+        start, count (int): Rows of choices, positions and values to apply
+        tokens (np.ndarray): uint8 concatenation of the dictionary tokens
+        token_offsets (np.ndarray): Start of each token in tokens, plus the
+            total length; a single 0 without a dictionary
+
+    Returns:
+        int: New input length
+    """
+    for i in range(start, start + count):
+        choice = choices[i]
+        data = buf[:length]
+        if choice == OP_BIT_FLIP:
+            bit_flip(data, positions[i, 1], positions[i, 0])
+        elif choice == OP_INTEGER:
+            integer_mut(data, positions[i, 0], positions[i, 1], values[i])
+        elif choice == OP_INTERESTING:
+            interesting_val(data, positions[i, 0], positions[i, 1], positions[i, 2])
+        elif choice == OP_CHUNK_REPLACE:
+            chunk_replace(data, positions[i, 0], positions[i, 1], positions[i, 2])
+        elif choice == OP_DICT_INSERT:
+            length = dict_insert(buf, length, tokens, token_offsets, positions[i, 0], positions[i, 1])
+        elif choice == OP_DICT_REPLACE:
+            dict_replace(buf, length, tokens, token_offsets, positions[i, 0], positions[i, 1])
+        elif choice == OP_ARITHMETIC:
+            arith_mut(data, positions[i, 0], positions[i, 1], values[i])
+    return length
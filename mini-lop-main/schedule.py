@@ -2,57 +2,121 @@ import random
 import os
 
 
-def select_next_seed(seed_queue, seeds_used_in_cycle=None, cycle_seed_count=None):
+class SeedPool:
     """
-    Select the next seed using AFL's favored seed prioritization strategy.
+    Set of seeds supporting O(1) add, removal and uniform random choice.
     
-    Args:
-        seed_queue: List of available seeds
-        seeds_used_in_cycle: Set of seed IDs used in current cycle
-        cycle_seed_count: Number of seeds at start of cycle
+    Seeds are kept in a list for random.choice, with a seed_id -> position
+    index so that removal can swap the last seed into the freed slot.
+    """
+    
+    def __init__(self, seeds=()):
+        self.seeds = []
+        self.positions = {}
+        for seed in seeds:
+            self.add(seed)
+            
+    def __len__(self):
+        return len(self.seeds)
         
-    Returns:
-        tuple: (selected_seed, seeds_used_in_cycle, cycle_seed_count, new_cycle)
+    def add(self, seed):
+        if seed.seed_id not in self.positions:
+            self.positions[seed.seed_id] = len(self.seeds)
+            self.seeds.append(seed)
+            
+    def discard(self, seed):
+        pos = self.positions.pop(seed.seed_id, None)
+        if pos is None:
+            return
+        last_seed = self.seeds.pop()
+        if pos < len(self.seeds):
+            self.seeds[pos] = last_seed
+            self.positions[last_seed.seed_id] = pos
+            
+    def choice(self):
+        return random.choice(self.seeds)
+
+
+class SeedScheduler:
     """
-    if not seed_queue:
-        return None, seeds_used_in_cycle, cycle_seed_count, False
+    Selects seeds using AFL's favored seed prioritization strategy.
+    
+    The unused seeds of the current cycle, and the favored ones among them,
+    are maintained incrementally instead of being rebuilt from the whole
+    queue on every selection.
+    """
+    
+    def __init__(self, seed_queue):
+        """
+        Initialize the scheduler and start the first cycle.
         
-    # Initialize cycle tracking if needed
-    if seeds_used_in_cycle is None:
-        seeds_used_in_cycle = set()
-    if cycle_seed_count is None:
-        cycle_seed_count = len(seed_queue)
+        Args:
+            seed_queue: List of available seeds, shared with the fuzzing loop
+        """
+        self.seed_queue = seed_queue
+        self.start_cycle()
         
-    # Check if we need to start a new cycle
-    new_cycle = False
-    if len(seeds_used_in_cycle) >= cycle_seed_count:
-        seeds_used_in_cycle.clear()
-        cycle_seed_count = len(seed_queue)
-        new_cycle = True
+    def start_cycle(self):
+        """Make every seed in the queue available again"""
+        self.cycle_seed_count = len(self.seed_queue)  # Number of seeds at start of cycle
+        self.used_in_cycle = 0
+        self.unused = SeedPool(self.seed_queue)
+        self.refresh_favored()
         
-    # Find unused seeds in current cycle
-    unused_seeds = [s for s in seed_queue if s.seed_id not in seeds_used_in_cycle]
-    
-    # Find unused favored seeds
-    unused_favored = [s for s in unused_seeds if s.favored]
-    
-    # Select next seed
-    if unused_favored and random.random() < 0.9:  # 90% chance to use favored seed
-        selected_seed = random.choice(unused_favored)
-    else:
-        selected_seed = random.choice(unused_seeds)
+    def refresh_favored(self):
+        """Recompute the unused favored seeds, call after favored flags change"""
+        self.unused_favored = SeedPool(s for s in self.unused.seeds if s.favored)
         
-    seeds_used_in_cycle.add(selected_seed.seed_id)
-    
-    return selected_seed, seeds_used_in_cycle, cycle_seed_count, new_cycle
+    def add_seed(self, seed):
+        """Make a seed added to the queue available in the current cycle"""
+        self.unused.add(seed)
+        if seed.favored:
+            self.unused_favored.add(seed)
+            
+    def select_next_seed(self):
+        """
+        Select the next seed, starting a new cycle when the current one is used up.
+        
+        Returns:
+            tuple: (selected_seed, new_cycle)
+        """
+        if not self.seed_queue:
+            return None, False
+            
+        # Check if we need to start a new cycle
+        new_cycle = False
+        if self.used_in_cycle >= self.cycle_seed_count:
+            self.start_cycle()
+            new_cycle = True
+            
+        # Select next seed
+        if self.unused_favored and random.random() < 0.9:  # 90% chance to use favored seed
+            selected_seed = self.unused_favored.choice()
+        else:
+            selected_seed = self.unused.choice()
+            
+        self.unused.discard(selected_seed)
+        self.unused_favored.discard(selected_seed)
+        self.used_in_cycle += 1
+        
+        return selected_seed, new_cycle
+
 
+# Relative change of the average execution time before a cached power schedule is recomputed
+POWER_SCHEDULE_TOLERANCE = 0.1
 
 # get the power schedule (# of new test inputs to generate for a seed)
 def get_power_schedule(seed, avg_exec_time):
     """
     Calculate the number of mutations based on the seed's performance score.
     The performance score is calculated considering execution time and coverage.
+    The seed's own execution time and coverage never change, so the result is
+    cached on the seed until avg_exec_time drifts by POWER_SCHEDULE_TOLERANCE.
     """
+    if seed._cached_mutations is not None and seed._cached_avg > 0 and \
+            abs(avg_exec_time - seed._cached_avg) / seed._cached_avg < POWER_SCHEDULE_TOLERANCE:
+        return seed._cached_mutations
+
     # Base performance score
     perf_score = 100
 
@@ -65,7 +129,7 @@ def get_power_schedule(seed, avg_exec_time):
 
     # Adjust score based on coverage (more coverage gets higher score)
     # Use log scale to prevent score explosion
-    coverage_factor = 1 + (len(seed.coverage) / 100)  # Normalize coverage impact
+    coverage_factor = 1 + (seed.coverage_len / 100)  # Normalize coverage impact
     perf_score *= coverage_factor
 
     # Convert performance score to number of mutations
@@ -75,5 +139,7 @@ def get_power_schedule(seed, avg_exec_time):
     mutations = min(mutations, max_mutations)
     mutations = max(mutations, 1)  # Ensure at least 1 mutation
 
+    seed._cached_mutations = mutations
+    seed._cached_avg = avg_exec_time
     return mutations
 
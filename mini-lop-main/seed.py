@@ -1,21 +1,71 @@
-import os
+import numpy as np
 
 class Seed:
     def __init__(self, path, seed_id, coverage, exec_time):
         self.path = path
         self.seed_id = seed_id
-        self.coverage = coverage  # Set of edges covered by this seed
+        self.coverage = coverage  # Indices of the edges covered by this seed
+        self.coverage_len = len(coverage)
         self.exec_time = exec_time
-        self.file_size = os.path.getsize(path)
+        # Seed contents are cached so mutations don't re-read the file
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        self.file_size = len(self.data)
         # By default, a seed is not marked as favored
         self.favored = False
+        # Power schedule cache, see schedule.get_power_schedule
+        self._cached_mutations = None
+        self._cached_avg = 0.0
 
-    def mark_favored(self):
-        self.favored = True
+class SeedTable:
+    """
+    Seed metadata stored as parallel NumPy arrays indexed by seed_id
+    (structure of arrays), so favored seeds can be selected without
+    touching the Seed objects.
+    """
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.exec_time = np.zeros(capacity, dtype=np.float64)
+        self.file_size = np.zeros(capacity, dtype=np.int64)
+        self.favored = np.zeros(capacity, dtype=bool)
 
-    def unmark_favored(self):
-        self.favored = False
+    def add(self, seed):
+        # Seeds must be added in seed_id order
+        if self.size == len(self.exec_time):
+            self._grow()
+        self.exec_time[self.size] = seed.exec_time
+        self.file_size[self.size] = seed.file_size
+        self.size += 1
+
+    def _grow(self):
+        # Double the capacity of every column
+        capacity = 2 * len(self.exec_time)
+        for name in ('exec_time', 'file_size', 'favored'):
+            column = np.zeros(capacity, dtype=getattr(self, name).dtype)
+            column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+
+    def update_favored(self, indptr, indices):
+        """
+        For each edge, mark the covering seed with minimal (exec_time * file_size).
+
+        Args:
+            indptr: CSR row pointers, the seeds covering edge k are indices[indptr[k]:indptr[k + 1]]
+            indices: CSR seed ids, every row must be non-empty
 
-    def get_valuation(self):
-        # Valuation used for sorting (execution time * file size)
-        return self.exec_time * self.file_size
+        Returns:
+            np.ndarray: Favored flag per seed, shape (size,)
+        """
+        favored = self.favored[:self.size]
+        favored[:] = False
+        if len(indices) == 0:
+            return favored
+        valuation = self.exec_time[:self.size] * self.file_size[:self.size]
+        # Rank seeds once by valuation (ties keep the lower seed_id), then the
+        # best seed of every edge is the one with the minimal rank
+        order = np.argsort(valuation, kind='stable')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(self.size)
+        best = np.minimum.reduceat(rank[indices], indptr[:-1])
+        favored[order[best]] = True
+        return favored